@@ -0,0 +1,54 @@
+"""Google Drive downloads shared by the web app and the neighbour table build."""
+import os
+from pathlib import Path
+
+import requests
+
+
+def get_download_url(session, base_url):
+    """Get the final download URL handling Google Drive confirmation token"""
+    response = session.get(base_url, stream=True)
+
+    for key, value in response.cookies.items():
+        if key.startswith('download_warning'):
+            return f"{base_url}&confirm={value}"
+
+    return base_url
+
+
+def save_model_file(response, model_path):
+    """Save the model file from the response stream"""
+    # Stream into a temporary file so an interrupted download never leaves a
+    # truncated model behind that later calls would take as complete
+    tmp_path = model_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                f.write(chunk)
+    os.replace(tmp_path, model_path)
+
+
+def download_file(file_id, path, label="File"):
+    """Download a file from Google Drive if it doesn't exist"""
+    if Path(path).exists():
+        return
+    try:
+        session = requests.Session()
+        base_url = f"https://drive.google.com/uc?export=download&id={file_id}"
+        final_url = get_download_url(session, base_url)
+        response = session.get(final_url, stream=True)
+        response.raise_for_status()
+
+        save_model_file(response, path)
+        print(f"{label} downloaded successfully")
+
+    except Exception as e:
+        print(f"Error downloading {label.lower()}: {str(e)}")
+        if Path(path + '.tmp').exists():
+            Path(path + '.tmp').unlink()
+        raise
+
+
+def download_model(file_id, model_path):
+    """Download the model from Google Drive if it doesn't exist"""
+    download_file(file_id, model_path, "Model")
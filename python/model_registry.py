@@ -0,0 +1,183 @@
+"""Registry of named embedding models.
+
+Models are declared up front but only downloaded and loaded on first use.
+When the estimated footprint of resident models exceeds the memory budget,
+the least recently used ones are dropped until it fits again.
+"""
+import gc
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+import gensim
+
+from neighbours import NEIGHBOURS_DIR, NeighbourTable, model_version
+
+# Rough per-word cost of the vocabulary dict and key strings on top of the vectors
+VOCAB_ENTRY_BYTES = 200
+
+
+class UnknownModelError(ValueError):
+    """Raised when a request names a model that is not registered"""
+
+
+class ModelEntry:
+    def __init__(self, name, file_id, path):
+        self.name = name
+        self.file_id = file_id
+        self.path = path
+        self.model = None
+        self.neighbours = None
+        self.memory_bytes = 0
+        self.load_seconds = None
+        self.load_count = 0
+        self.eviction_count = 0
+        self.last_used = None
+        # Serializes downloads and loads of this model without blocking the others
+        self.load_lock = Lock()
+
+    def status(self):
+        return {
+            'resident': self.model is not None,
+            'memory_bytes': self.memory_bytes,
+            'load_seconds': self.load_seconds,
+            'load_count': self.load_count,
+            'eviction_count': self.eviction_count,
+            'last_used': self.last_used,
+            'neighbours_loaded': self.neighbours is not None
+        }
+
+
+class ModelRegistry:
+    def __init__(self, specs, default_name, memory_budget_bytes, download):
+        if default_name not in specs:
+            raise ValueError(f"Default model '{default_name}' is not registered")
+
+        self.entries = {
+            name: ModelEntry(name, spec['file_id'], spec['path'])
+            for name, spec in specs.items()
+        }
+        self.default_name = default_name
+        self.memory_budget_bytes = memory_budget_bytes
+        self.download = download
+        # Resident model names, least recently used first
+        self.resident = OrderedDict()
+        # Estimated cost of models currently being loaded
+        self.reserved_bytes = 0
+        # Guards residency and bookkeeping only, never held across a download or load
+        self.lock = Lock()
+
+    def get(self, name=None):
+        """Return the (model, neighbours) pair for `name` (or the default model), loading it if needed"""
+        entry = self._entry(name)
+        pair = self._touch(entry)
+        if pair is not None:
+            return pair
+
+        with entry.load_lock:
+            # Another request may have loaded it while we waited
+            pair = self._touch(entry)
+            if pair is not None:
+                return pair
+            # Use the pair _load installed, a concurrent eviction may already have dropped it
+            return self._load(entry)
+
+    def status(self):
+        with self.lock:
+            return {
+                'default': self.default_name,
+                'memory_budget_bytes': self.memory_budget_bytes,
+                'resident_bytes': self._resident_bytes(),
+                'models': {name: entry.status() for name, entry in self.entries.items()}
+            }
+
+    def _entry(self, name):
+        if name is None:
+            return self.entries[self.default_name]
+        # Only a non-empty name selects a model, anything else is a client error
+        entry = self.entries.get(name) if isinstance(name, str) else None
+        if entry is None:
+            raise UnknownModelError(f"Unknown model '{name}'")
+        return entry
+
+    def _neighbours_dir(self, entry):
+        return str(Path(NEIGHBOURS_DIR) / entry.name)
+
+    def _resident_bytes(self):
+        return sum(self.entries[name].memory_bytes for name in self.resident)
+
+    def _touch(self, entry):
+        """Mark a resident model as used and return its pair, or None if it is not resident"""
+        with self.lock:
+            if entry.model is None:
+                return None
+            self.resident.move_to_end(entry.name)
+            entry.last_used = time.time()
+            return entry.model, entry.neighbours
+
+    def _load(self, entry):
+        """Download and load a model, returning the (model, neighbours) pair it installed"""
+        start = time.time()
+        self.download(entry.file_id, entry.path)
+
+        # The binary word2vec file is close to the size of the loaded vectors,
+        # so make room for it before loading rather than after
+        estimate = Path(entry.path).stat().st_size
+        with self.lock:
+            evicted = self._evict(estimate)
+            self.reserved_bytes += estimate
+        if evicted:
+            gc.collect()
+
+        try:
+            model = gensim.models.KeyedVectors.load_word2vec_format(
+                entry.path,
+                binary=True,
+                unicode_errors='ignore'
+            )
+        finally:
+            with self.lock:
+                self.reserved_bytes -= estimate
+
+        try:
+            # Tables are only built offline by neighbours.py; a stale one is ignored
+            neighbours = NeighbourTable.load(model_version(entry.path), self._neighbours_dir(entry))
+        except Exception as e:
+            print(f"Error loading neighbour table for model '{entry.name}', falling back to live search: {str(e)}")
+            neighbours = None
+
+        with self.lock:
+            entry.model = model
+            entry.neighbours = neighbours
+            entry.memory_bytes = model.vectors.nbytes + len(model.key_to_index) * VOCAB_ENTRY_BYTES
+            entry.load_seconds = time.time() - start
+            entry.load_count += 1
+            self.resident[entry.name] = entry
+            # Refine with the measured footprint now that it is known
+            evicted = self._evict(0, keep=entry.name)
+        if evicted:
+            gc.collect()
+
+        print(f"Model '{entry.name}' loaded successfully in {entry.load_seconds:.1f}s")
+        return model, neighbours
+
+    def _evict(self, incoming_bytes, keep=None):
+        """Drop least recently used models until `incoming_bytes` more fits the budget, caller holds the lock"""
+        if not self.memory_budget_bytes:
+            return False
+
+        evicted = False
+        for name in list(self.resident):
+            if self._resident_bytes() + self.reserved_bytes + incoming_bytes <= self.memory_budget_bytes:
+                break
+            if name == keep:
+                continue
+            del self.resident[name]
+            entry = self.entries[name]
+            entry.model = None
+            entry.neighbours = None
+            entry.eviction_count += 1
+            evicted = True
+            print(f"Model '{name}' evicted to stay within the memory budget")
+        return evicted
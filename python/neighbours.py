@@ -0,0 +1,234 @@
+"""Precomputed nearest-neighbour table for the Lexitom target pool.
+
+Every Lexitom target comes from the word list, so the top-K neighbours of
+each of those words can be computed once per model instead of on every
+`/similar` call. The table is stored as two `.npy` arrays that are opened
+memory-mapped, plus a small JSON file holding the row words, the model
+version and a hash of the word list the table was built from.
+
+The table is only built offline, never by the web process; a missing or
+stale table is logged and `/similar` falls back to `most_similar`. Build it
+locally with:
+
+    python neighbours.py --name default --model model.bin --words motscommuns.txt
+
+On Heroku the dyno disk is wiped on every restart, so `bin/post_compile`
+builds the table during the slug build instead: it downloads the model and
+word list with `--model-file-id`/`--words-file-id`, writes
+`neighbours/default/` into the slug, then deletes the downloads. The web
+process downloads the same model file at runtime, so its fingerprint still
+matches the table. Any other registered model needs its own line there.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+NEIGHBOURS_DIR = "neighbours"
+NEIGHBOURS_TOPK = 100
+NEIGHBOURS_CHUNK_SIZE = 64
+META_FILE = "meta.json"
+INDICES_FILE = "indices.npy"
+SCORES_FILE = "scores.npy"
+FINGERPRINT_BYTES = 1 << 20
+
+# Set in the parent before the pool is forked so workers share the vectors
+# copy-on-write instead of receiving them pickled.
+_worker_vectors = None
+_worker_topk = NEIGHBOURS_TOPK
+
+
+def model_version(model_path):
+    """Fingerprint the model file from its size and its first and last megabyte"""
+    path = Path(model_path)
+    size = path.stat().st_size
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        f.seek(max(size - FINGERPRINT_BYTES, 0))
+        digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def words_version(words):
+    """Hash the target word list, ignoring order and duplicates"""
+    return hashlib.sha1('\n'.join(sorted(set(words))).encode('utf-8')).hexdigest()
+
+
+def _neighbours_chunk(rows):
+    """Compute the top-K neighbours of the given vocabulary rows"""
+    sims = _worker_vectors[rows] @ _worker_vectors.T
+    sims[np.arange(len(rows)), rows] = -np.inf
+
+    top = np.argpartition(-sims, _worker_topk, axis=1)[:, :_worker_topk]
+    top_scores = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+
+    indices = np.take_along_axis(top, order, axis=1).astype(np.int32)
+    scores = np.take_along_axis(top_scores, order, axis=1).astype(np.float32)
+    return indices, scores
+
+
+def build_table(normed_vectors, key_to_index, words, version,
+                out_dir=NEIGHBOURS_DIR, topk=NEIGHBOURS_TOPK,
+                processes=None, chunk_size=NEIGHBOURS_CHUNK_SIZE):
+    """Compute and write the neighbour table for every word of the pool found in the model"""
+    global _worker_vectors, _worker_topk
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    pool_words = list(dict.fromkeys(w for w in words if w in key_to_index))
+    rows = np.array([key_to_index[w] for w in pool_words], dtype=np.int32)
+    topk = min(topk, len(key_to_index) - 1)
+
+    indices_tmp = out / (INDICES_FILE + '.tmp')
+    scores_tmp = out / (SCORES_FILE + '.tmp')
+    indices = np.lib.format.open_memmap(indices_tmp, mode='w+', dtype=np.int32, shape=(len(rows), topk))
+    scores = np.lib.format.open_memmap(scores_tmp, mode='w+', dtype=np.float32, shape=(len(rows), topk))
+
+    start = time.time()
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    _worker_vectors = normed_vectors
+    _worker_topk = topk
+    try:
+        with get_context('fork').Pool(processes=processes) as pool:
+            offset = 0
+            for chunk_indices, chunk_scores in pool.imap(_neighbours_chunk, chunks):
+                indices[offset:offset + len(chunk_indices)] = chunk_indices
+                scores[offset:offset + len(chunk_scores)] = chunk_scores
+                offset += len(chunk_indices)
+    finally:
+        _worker_vectors = None
+
+    indices.flush()
+    scores.flush()
+    del indices, scores
+    # Only drop the old metadata once the new arrays are complete, so an
+    # interrupted build leaves the previous table in place
+    if (out / META_FILE).exists():
+        (out / META_FILE).unlink()
+    os.replace(indices_tmp, out / INDICES_FILE)
+    os.replace(scores_tmp, out / SCORES_FILE)
+
+    meta_tmp = out / (META_FILE + '.tmp')
+    with open(meta_tmp, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': version,
+            'words_version': words_version(words),
+            'topk': topk,
+            'words': pool_words
+        }, f, ensure_ascii=False)
+    os.replace(meta_tmp, out / META_FILE)
+
+    print(f"Neighbour table built for {len(pool_words)} words in {time.time() - start:.1f}s")
+
+
+class NeighbourTable:
+    """Read-only view over a built neighbour table"""
+
+    def __init__(self, words, indices, scores, version, words_version=None):
+        self.row_of = {word: row for row, word in enumerate(words)}
+        self.indices = indices
+        self.scores = scores
+        self.version = version
+        self.words_version = words_version
+        self.topk = indices.shape[1]
+
+    @classmethod
+    def load(cls, version, out_dir=NEIGHBOURS_DIR):
+        """Open the table memory-mapped, or return None if it is missing or built from another model"""
+        out = Path(out_dir)
+        try:
+            with open(out / META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            print(f"Warning: no neighbour table in {out}, run neighbours.py to build it")
+            return None
+
+        if meta.get('version') != version:
+            print(f"Warning: neighbour table in {out} was built from another model, run neighbours.py to rebuild it")
+            return None
+
+        indices = np.load(out / INDICES_FILE, mmap_mode='r')
+        scores = np.load(out / SCORES_FILE, mmap_mode='r')
+        return cls(meta['words'], indices, scores, version, meta.get('words_version'))
+
+    def get(self, word, topn, index_to_key):
+        """Return the `topn` neighbours of `word` as (word, score) pairs, or None on a table miss"""
+        row = self.row_of.get(word)
+        if row is None or isinstance(topn, bool) or not isinstance(topn, int) or topn > self.topk:
+            return None
+        if topn < 1:
+            # Same as most_similar
+            return []
+        return [
+            (index_to_key[i], float(s))
+            for i, s in zip(self.indices[row, :topn], self.scores[row, :topn])
+        ]
+
+
+def ensure_table(model, model_path, words, out_dir=NEIGHBOURS_DIR,
+                 topk=NEIGHBOURS_TOPK, processes=None, force=False):
+    """Load the neighbour table for this model, rebuilding it first if it is missing or stale (offline only)"""
+    version = model_version(model_path)
+    table = None if force else NeighbourTable.load(version, out_dir)
+    if (table is not None
+            and table.words_version == words_version(words)
+            and table.topk >= min(topk, len(model.key_to_index) - 1)):
+        return table
+
+    print("Neighbour table missing or stale, rebuilding...")
+    build_table(
+        model.get_normed_vectors(),
+        model.key_to_index,
+        words,
+        version,
+        out_dir=out_dir,
+        topk=topk,
+        processes=processes
+    )
+    return NeighbourTable.load(version, out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the nearest-neighbour table for the target word pool")
+    parser.add_argument('--model', default="model.bin", help="word2vec binary model")
+    parser.add_argument('--words', default="motscommuns.txt", help="target word list")
+    parser.add_argument('--name', default="default", help="registry name of the model")
+    parser.add_argument('--out', default=None, help="output directory (default: neighbours/<name>)")
+    parser.add_argument('--topk', type=int, default=NEIGHBOURS_TOPK, help="neighbours kept per word")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="rebuild even if the table is current")
+    parser.add_argument('--model-file-id', default=None, help="Google Drive id to download the model from if missing")
+    parser.add_argument('--words-file-id', default=None, help="Google Drive id to download the word list from if missing")
+    args = parser.parse_args()
+
+    import gensim
+    from drive import download_file, download_model
+
+    if args.model_file_id:
+        download_model(args.model_file_id, args.model)
+    if args.words_file_id:
+        download_file(args.words_file_id, args.words, "Word list")
+
+    model = gensim.models.KeyedVectors.load_word2vec_format(
+        args.model,
+        binary=True,
+        unicode_errors='ignore'
+    )
+    with open(args.words, 'r') as f:
+        words = f.read().splitlines()
+
+    out_dir = args.out or str(Path(NEIGHBOURS_DIR) / args.name)
+    ensure_table(model, args.model, words, out_dir=out_dir, topk=args.topk,
+                 processes=args.processes, force=args.force)
+
+
+if __name__ == '__main__':
+    main()
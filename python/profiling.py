@@ -0,0 +1,176 @@
+"""On-demand request profiling.
+
+When enabled, each request gets a trace that collects the time spent in named
+stages (model lookup, vector math, Firestore, ...). A trace is kept if the
+request was sampled or ran longer than the latency threshold, and only the
+slowest ones are retained. When disabled, `stage()` hands back a shared no-op
+context manager after a single attribute check.
+"""
+import heapq
+import itertools
+import math
+import random
+import time
+from contextlib import nullcontext
+from threading import Lock
+
+from flask import g, has_request_context, request
+
+NULL_STAGE = nullcontext()
+
+
+def _number(value, name, cast):
+    # bool is an int subclass, but true/false is never a meaningful rate or size
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number")
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be a number")
+    # NaN or infinity would be sent back as invalid JSON by the config endpoint
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+class _Stage:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class RequestTrace:
+    def __init__(self, method, path, sampled):
+        self.method = method
+        self.path = path
+        self.sampled = sampled
+        self.timestamp = int(time.time() * 1000)
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        stage = self.stages.setdefault(name, {'ms': 0.0, 'count': 0})
+        stage['ms'] += seconds * 1000
+        stage['count'] += 1
+
+    def to_dict(self, duration_ms, status):
+        staged_ms = sum(stage['ms'] for stage in self.stages.values())
+        return {
+            'method': self.method,
+            'path': self.path,
+            'status': status,
+            'timestamp': self.timestamp,
+            'duration_ms': round(duration_ms, 3),
+            'sampled': self.sampled,
+            'stages': {
+                name: {'ms': round(stage['ms'], 3), 'count': stage['count']}
+                for name, stage in self.stages.items()
+            },
+            'unstaged_ms': round(max(duration_ms - staged_ms, 0.0), 3)
+        }
+
+
+class RequestProfiler:
+    def __init__(self, enabled=False, sample_rate=0.0, threshold_ms=None, capacity=20):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.threshold_ms = None
+        self.capacity = 20
+        # Min-heap of (duration_ms, seq, trace) holding the slowest traces
+        self._slowest = []
+        self._seq = itertools.count()
+        self._lock = Lock()
+        self.configure(enabled=enabled, sample_rate=sample_rate, threshold_ms=threshold_ms, capacity=capacity)
+
+    def configure(self, enabled=None, sample_rate=None, threshold_ms=None, capacity=None, clear=False):
+        """Apply new settings, validating all of them before any is assigned"""
+        if enabled is not None and not isinstance(enabled, bool):
+            raise ValueError("enabled must be a boolean")
+        if not isinstance(clear, bool):
+            raise ValueError("clear must be a boolean")
+        if sample_rate is not None:
+            sample_rate = min(max(_number(sample_rate, 'sample_rate', float), 0.0), 1.0)
+        if threshold_ms is not None:
+            threshold_ms = _number(threshold_ms, 'threshold_ms', float)
+        if capacity is not None:
+            capacity = max(_number(capacity, 'capacity', int), 1)
+
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if threshold_ms is not None:
+                # A negative threshold turns slow-request capture off
+                self.threshold_ms = threshold_ms if threshold_ms >= 0 else None
+            if capacity is not None:
+                self.capacity = capacity
+                while len(self._slowest) > self.capacity:
+                    heapq.heappop(self._slowest)
+            if clear:
+                self._slowest = []
+
+    def config(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'threshold_ms': self.threshold_ms,
+            'capacity': self.capacity
+        }
+
+    def start_request(self):
+        """Attach a trace to the current request, to be called from a before_request hook"""
+        if not self.enabled:
+            return
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.threshold_ms is None:
+            return
+        g.profile_trace = RequestTrace(request.method, request.path, sampled)
+
+    def stage(self, name):
+        """Time a block of the current request under `name`"""
+        if not self.enabled or not has_request_context():
+            return NULL_STAGE
+        trace = g.get('profile_trace')
+        if trace is None:
+            return NULL_STAGE
+        return trace.stage(name)
+
+    def finish_request(self, response):
+        """Keep the trace if it qualifies, to be called from an after_request hook"""
+        if not self.enabled:
+            return response
+        trace = g.pop('profile_trace', None)
+        if trace is None:
+            return response
+
+        duration_ms = (time.perf_counter() - trace.start) * 1000
+        threshold_ms = self.threshold_ms
+        if not trace.sampled and (threshold_ms is None or duration_ms < threshold_ms):
+            return response
+
+        item = (duration_ms, next(self._seq), trace.to_dict(duration_ms, response.status_code))
+        with self._lock:
+            if len(self._slowest) < self.capacity:
+                heapq.heappush(self._slowest, item)
+            elif duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+        return response
+
+    def traces(self):
+        """Return the retained traces, slowest first"""
+        with self._lock:
+            items = sorted(self._slowest, reverse=True)
+        return [trace for _, _, trace in items]
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import model_registry
+from model_registry import ModelRegistry, UnknownModelError
+
+MODEL_BYTES = 1000
+
+
+class FakeModel:
+    def __init__(self, path):
+        self.path = path
+        # Same footprint as the file so estimates and measurements agree
+        self.vectors = np.zeros(MODEL_BYTES // 4, dtype=np.float32)
+        self.key_to_index = {}
+
+
+class ModelRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+        self.specs = {}
+        for name in ('a', 'b', 'c'):
+            path = os.path.join(self.tmp.name, f'{name}.bin')
+            with open(path, 'wb') as f:
+                f.write(b'\0' * MODEL_BYTES)
+            self.specs[name] = {'file_id': name, 'path': path}
+
+        self.downloads = []
+        self.loads = []
+        self.on_load = None
+        patcher = mock.patch.object(
+            model_registry.gensim.models.KeyedVectors,
+            'load_word2vec_format',
+            side_effect=self._load
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _load(self, path, **kwargs):
+        if self.on_load is not None:
+            self.on_load(path)
+        self.loads.append(path)
+        return FakeModel(path)
+
+    def _registry(self, budget=0):
+        return ModelRegistry(self.specs, 'a', budget, lambda file_id, path: self.downloads.append(file_id))
+
+    def _resident(self, registry):
+        return [name for name, status in registry.status()['models'].items() if status['resident']]
+
+    def test_models_are_loaded_lazily_once(self):
+        registry = self._registry()
+        self.assertEqual(self._resident(registry), [])
+
+        model, neighbours = registry.get('b')
+        self.assertEqual(model.path, self.specs['b']['path'])
+        self.assertIsNone(neighbours)
+        registry.get('b')
+
+        self.assertEqual(self.downloads, ['b'])
+        self.assertEqual(len(self.loads), 1)
+        self.assertEqual(self._resident(registry), ['b'])
+
+    def test_default_model_is_used_without_a_name(self):
+        model, _ = self._registry().get()
+        self.assertEqual(model.path, self.specs['a']['path'])
+
+    def test_invalid_names_are_rejected(self):
+        registry = self._registry()
+        for name in ('zz', '', 0, ['a']):
+            with self.assertRaises(UnknownModelError):
+                registry.get(name)
+        self.assertEqual(self.loads, [])
+
+    def test_least_recently_used_model_is_evicted(self):
+        registry = self._registry(budget=2 * MODEL_BYTES)
+        registry.get('a')
+        registry.get('b')
+        registry.get('a')
+        registry.get('c')
+
+        self.assertEqual(self._resident(registry), ['a', 'c'])
+        self.assertEqual(registry.status()['models']['b']['eviction_count'], 1)
+        self.assertLessEqual(registry.status()['resident_bytes'], 2 * MODEL_BYTES)
+
+    def test_eviction_happens_before_the_new_model_loads(self):
+        registry = self._registry(budget=MODEL_BYTES)
+        registry.get('a')
+
+        resident_during_load = []
+        self.on_load = lambda path: resident_during_load.append(self._resident(registry))
+        registry.get('b')
+
+        self.assertEqual(resident_during_load, [[]])
+        self.assertEqual(self._resident(registry), ['b'])
+
+    def test_reservation_is_released_when_a_load_fails(self):
+        registry = self._registry(budget=2 * MODEL_BYTES)
+
+        def fail(path):
+            raise RuntimeError("corrupt model")
+        self.on_load = fail
+        with self.assertRaises(RuntimeError):
+            registry.get('a')
+
+        self.assertEqual(registry.reserved_bytes, 0)
+        self.assertEqual(self._resident(registry), [])
+
+    def test_get_returns_the_loaded_pair_even_if_evicted_right_after(self):
+        registry = self._registry()
+        with mock.patch.object(registry, '_touch', return_value=None):
+            model, _ = registry.get('a')
+        self.assertEqual(model.path, self.specs['a']['path'])
+
+
+if __name__ == '__main__':
+    unittest.main()
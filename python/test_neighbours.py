@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import neighbours
+from neighbours import NeighbourTable, ensure_table, model_version
+
+
+class FakeModel:
+    def __init__(self, size=50, dim=8):
+        vectors = np.random.default_rng(0).normal(size=(size, dim)).astype(np.float32)
+        self.vectors = vectors
+        self.index_to_key = [f'w{i}' for i in range(size)]
+        self.key_to_index = {key: i for i, key in enumerate(self.index_to_key)}
+
+    def get_normed_vectors(self):
+        return self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+
+
+class NeighbourTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.out_dir = os.path.join(self.tmp.name, 'neighbours')
+        self.model_path = os.path.join(self.tmp.name, 'model.bin')
+        with open(self.model_path, 'wb') as f:
+            f.write(b'model')
+        self.model = FakeModel()
+
+    def _ensure(self, words, **kwargs):
+        return ensure_table(self.model, self.model_path, words, out_dir=self.out_dir,
+                            topk=10, processes=1, **kwargs)
+
+    def test_neighbours_match_brute_force(self):
+        table = self._ensure(['w3', 'w7', 'missing'])
+
+        normed = self.model.get_normed_vectors()
+        sims = normed @ normed[3]
+        sims[3] = -np.inf
+        expected = [self.model.index_to_key[i] for i in np.argsort(-sims)[:5]]
+
+        got = table.get('w3', 5, self.model.index_to_key)
+        self.assertEqual([word for word, _ in got], expected)
+        self.assertIsNone(table.get('missing', 5, self.model.index_to_key))
+
+    def test_topn_outside_the_table_behaves_like_most_similar(self):
+        table = self._ensure(['w3'])
+        self.assertEqual(table.get('w3', 0, self.model.index_to_key), [])
+        self.assertEqual(table.get('w3', -3, self.model.index_to_key), [])
+        self.assertIsNone(table.get('w3', True, self.model.index_to_key))
+        self.assertIsNone(table.get('w3', 11, self.model.index_to_key))
+
+    def test_current_table_is_reused(self):
+        self._ensure(['w3'])
+        with mock.patch.object(neighbours, 'build_table') as build:
+            self._ensure(['w3'])
+        build.assert_not_called()
+
+    def test_changed_word_list_triggers_a_rebuild(self):
+        self._ensure(['w3'])
+        table = self._ensure(['w3', 'w4'])
+        self.assertIsNotNone(table.get('w4', 5, self.model.index_to_key))
+
+    def test_table_from_another_model_is_not_loaded(self):
+        self._ensure(['w3'])
+        with open(self.model_path, 'wb') as f:
+            f.write(b'another model')
+        self.assertIsNone(NeighbourTable.load(model_version(self.model_path), self.out_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
-import gensim
 import random
 import sys
 from pathlib import Path
@@ -14,7 +13,11 @@ import json
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 import pytz
+import hmac
 from threading import Lock
+from drive import download_model
+from model_registry import ModelRegistry, UnknownModelError
+from profiling import RequestProfiler
 
 app = Flask(__name__)
 CORS(app)
@@ -42,10 +45,30 @@ wikiURL = "https://fr.wikipedia.org/w/api.php"
 ARTICLES_FILE_ID = "15mwzZOIMjujl2DSNh--nRAcflTJs1ndk"
 ARTICLES_FILE_PATH = "articles.txt"
 
+DEFAULT_MODEL = os.environ.get('DEFAULT_MODEL', 'default')
+MODEL_SPECS = {'default': {'file_id': FILE_ID, 'path': MODEL_PATH}}
+if 'MODELS' in os.environ:
+    MODEL_SPECS.update(json.loads(os.environ.get('MODELS')))
+MODEL_MEMORY_BUDGET = int(float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 0)) * 1024 * 1024)
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+profiler = RequestProfiler(
+    enabled=os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes'),
+    # Raw strings, validated and clamped by the profiler like values from the admin endpoint
+    sample_rate=os.environ.get('PROFILING_SAMPLE_RATE', 0.0),
+    threshold_ms=os.environ.get('PROFILING_THRESHOLD_MS'),
+    capacity=os.environ.get('PROFILING_CAPACITY', 20)
+)
+
 # Add application state management
 class ApplicationState:
     def __init__(self):
-        self.model = None
+        self.models = ModelRegistry(
+            MODEL_SPECS,
+            DEFAULT_MODEL,
+            MODEL_MEMORY_BUDGET,
+            download=download_model
+        )
         self.cached_word = None
         self.cached_timestamp = 0
         self.update_lock = Lock()
@@ -102,8 +125,9 @@ def _get_random_wiki_article():
     title = title.replace('_', ' ')
 
     api_url = f"https://fr.wikipedia.org/w/api.php?action=query&titles={title}&format=json&prop=extracts&explaintext"
-    response = requests.get(api_url)
-    data = response.json()
+    with profiler.stage('outbound_http'):
+        response = requests.get(api_url)
+        data = response.json()
 
     pages = data.get('query', {}).get('pages', {})
     for page_id, page_info in pages.items():
@@ -240,7 +264,6 @@ def init_scheduler():
 
     if not scheduler.running:
         scheduler.start()
-    download_model()
     download_word_list()
     download_articles_list()
     load_model()
@@ -253,56 +276,24 @@ def remove_double_slash():
         path = request.path.replace('//', '/')
         return redirect(path, code=301)
 
-def get_download_url(session, base_url):
-    """Get the final download URL handling Google Drive confirmation token"""
-    response = session.get(base_url, stream=True)
-
-    for key, value in response.cookies.items():
-        if key.startswith('download_warning'):
-            return f"{base_url}&confirm={value}"
-
-    return base_url
-
-def save_model_file(response):
-    """Save the model file from the response stream"""
-    with open(MODEL_PATH, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-
-def download_model():
-    """Download the model from Google Drive if it doesn't exist"""
-    if Path(MODEL_PATH).exists():
-        return
-    try:
-        session = requests.Session()
-        base_url = f"https://drive.google.com/uc?export=download&id={FILE_ID}"
-        final_url = get_download_url(session, base_url)
-        response = session.get(final_url, stream=True)
-        response.raise_for_status()
+@app.before_request
+def start_profiling():
+    profiler.start_request()
 
-        save_model_file(response)
-        print("Model downloaded successfully")
+@app.after_request
+def finish_profiling(response):
+    return profiler.finish_request(response)
 
-    except Exception as e:
-        print(f"Error downloading model: {str(e)}")
-        if Path(MODEL_PATH).exists():
-            Path(MODEL_PATH).unlink()
-        raise
+def _is_admin():
+    """Check the admin token header against ADMIN_TOKEN"""
+    token = request.headers.get('X-Admin-Token', '')
+    # Compare bytes, compare_digest rejects non-ASCII str
+    return ADMIN_TOKEN is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
 
 def load_model():
-    """Load the model from the specified path"""
-    if app_state.model is not None:
-        return
-
+    """Load the default model and its neighbour table ahead of traffic"""
     try:
-        model_path = get_model_path()
-        app_state.model = gensim.models.KeyedVectors.load_word2vec_format(
-            model_path,
-            binary=True,
-            unicode_errors='ignore'
-        )
-        print("Model loaded successfully")
+        app_state.models.get()
     except Exception as e:
         print(f"An unexpected error occurred: {str(e)}")
         sys.exit(1)
@@ -366,21 +357,26 @@ def trigger_word_update():
             'error': str(e)
         }), 500
 
-def get_model_path():
-    """Get the path to the model file"""
-    return MODEL_PATH
-
 @app.route('/embed', methods=['POST'])
 def get_embedding():
     data = request.get_json()
     try:
         received_word = data.get('text', '')
+        with profiler.stage('model_lookup'):
+            model, _ = app_state.models.get(data.get('model'))
 
-        embedding = app_state.model[received_word].tolist()
+        with profiler.stage('vector_math'):
+            embedding = model[received_word].tolist()
+        with profiler.stage('json_encoding'):
+            return jsonify({
+                'success': True,
+                'embedding': embedding
+            })
+    except UnknownModelError as e:
         return jsonify({
-            'success': True,
-            'embedding': embedding
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except KeyError:
         return jsonify({
             'success': False,
@@ -398,14 +394,28 @@ def get_similar_words():
     try:
         word = data.get('text', '')
         topn = data.get('topn', 100)
-
-        similar_words = app_state.model.most_similar(word, topn=topn)
-        result = [{"word": word, "similarity": float(score)} for word, score in similar_words]
-
+        with profiler.stage('model_lookup'):
+            model, neighbours = app_state.models.get(data.get('model'))
+
+        with profiler.stage('vector_math'):
+            similar_words = None
+            # most_similar also accepts a list of positive words, the table only single words
+            if neighbours is not None and isinstance(word, str):
+                similar_words = neighbours.get(word, topn, model.index_to_key)
+            if similar_words is None:
+                similar_words = model.most_similar(word, topn=topn)
+            result = [{"word": word, "similarity": float(score)} for word, score in similar_words]
+
+        with profiler.stage('json_encoding'):
+            return jsonify({
+                'success': True,
+                'similar_words': result
+            })
+    except UnknownModelError as e:
         return jsonify({
-            'success': True,
-            'similar_words': result
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except KeyError:
         return jsonify({
             'success': False,
@@ -420,11 +430,20 @@ def get_similar_words():
 @app.route('/random', methods=['GET'])
 def get_random_word():
     try:
-        word = random.choice(list(app_state.model.key_to_index.keys()))
+        with profiler.stage('model_lookup'):
+            model, _ = app_state.models.get(request.args.get('model'))
+        with profiler.stage('vector_math'):
+            word = random.choice(list(model.key_to_index.keys()))
+        with profiler.stage('json_encoding'):
+            return jsonify({
+                'success': True,
+                'word': word
+            })
+    except UnknownModelError as e:
         return jsonify({
-            'success': True,
-            'word': word
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -437,12 +456,21 @@ def get_similarity():
         data = request.get_json()
         word1 = data.get('word1', '')
         word2 = data.get('word2', '')
+        with profiler.stage('model_lookup'):
+            model, _ = app_state.models.get(data.get('model'))
 
-        similarity = app_state.model.similarity(word1, word2)
+        with profiler.stage('vector_math'):
+            similarity = model.similarity(word1, word2)
+        with profiler.stage('json_encoding'):
+            return jsonify({
+                'success': True,
+                'similarity': float(similarity)
+            })
+    except UnknownModelError as e:
         return jsonify({
-            'success': True,
-            'similarity': float(similarity)
-        })
+            'success': False,
+            'error': str(e)
+        }), 400
     except KeyError as _:
         return jsonify({
             'success': False,
@@ -456,9 +484,11 @@ def get_similarity():
 
 @app.route('/health', methods=['GET'])
 def health_check():
+    models = app_state.models.status()
     return jsonify({
         'status': 'healthy',
-        'model_loaded': app_state.model is not None
+        'model_loaded': models['models'][models['default']]['resident'],
+        'models': models
     })
 
 @app.route('/current-word', methods=['GET'])
@@ -469,7 +499,8 @@ def get_current_word():
         current_time = int(datetime.now(french_tz).timestamp() * 1000)
 
         # Get the document first
-        doc = db.collection(COLLECTION).document(DOCUMENT).get()
+        with profiler.stage('firestore'):
+            doc = db.collection(COLLECTION).document(DOCUMENT).get()
         if not doc.exists:
             return jsonify({
                 'success': False,
@@ -501,14 +532,15 @@ def get_current_word():
         next_update_time = int(next_dt.timestamp() * 1000)
         remaining_time = next_update_time - current_time
 
-        return jsonify({
-            'success': True,
-            'word': word,
-            'timestamp': timestamp,
-            'current_time': current_time,
-            'time_remaining': remaining_time,
-            'found_count': found_count
-        })
+        with profiler.stage('json_encoding'):
+            return jsonify({
+                'success': True,
+                'word': word,
+                'timestamp': timestamp,
+                'current_time': current_time,
+                'time_remaining': remaining_time,
+                'found_count': found_count
+            })
     except Exception as e:
         print(f"Error in get_current_word: {str(e)}")
         return jsonify({
@@ -598,7 +630,8 @@ def choose_word():
 @app.route('/current-wiki', methods=['GET'])
 def get_current_wiki():
     try:
-        doc = db.collection(COLLECTION).document(WIKI_DOCUMENT).get()
+        with profiler.stage('firestore'):
+            doc = db.collection(COLLECTION).document(WIKI_DOCUMENT).get()
         if not doc.exists:
             return jsonify({
                 'success': False,
@@ -637,16 +670,17 @@ def get_wiki_article():
                 'error': 'No title provided'
             }), 400
 
-        article = requests.get(
-            wikiURL,
-            params={
-                "action": "query",
-                "format": "json",
-                "titles": title,
-                "prop": "extracts",
-                "explaintext": "1"
-            }
-        ).json()
+        with profiler.stage('outbound_http'):
+            article = requests.get(
+                wikiURL,
+                params={
+                    "action": "query",
+                    "format": "json",
+                    "titles": title,
+                    "prop": "extracts",
+                    "explaintext": "1"
+                }
+            ).json()
 
         page_id = list(article["query"]["pages"].keys())[0]
         content = article["query"]["pages"][page_id].get("extract", "")
@@ -707,5 +741,49 @@ def increment_wiki_found_count():
             'error': str(e)
         }), 500
 
+@app.route('/admin/profiling', methods=['GET'])
+def get_profiling():
+    if not _is_admin():
+        return jsonify({
+            'success': False,
+            'error': 'Forbidden'
+        }), 403
+
+    return jsonify({
+        'success': True,
+        'config': profiler.config(),
+        'traces': profiler.traces()
+    })
+
+@app.route('/admin/profiling', methods=['POST'])
+def configure_profiling():
+    """Enable, disable or tune request profiling, optionally clearing kept traces."""
+    if not _is_admin():
+        return jsonify({
+            'success': False,
+            'error': 'Forbidden'
+        }), 403
+
+    try:
+        data = request.get_json() or {}
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        profiler.configure(
+            enabled=data.get('enabled'),
+            sample_rate=data.get('sample_rate'),
+            threshold_ms=data.get('threshold_ms'),
+            capacity=data.get('capacity'),
+            clear=data.get('clear', False)
+        )
+        return jsonify({
+            'success': True,
+            'config': profiler.config()
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file